@@ -0,0 +1,327 @@
+"""
+Almacén Incremental de Exportaciones
+Manifiesto persistente (SQLite) para el pipeline de exportación.
+
+Cada etapa se identifica por una clave derivada del contenido de la imagen
+fuente y de los parámetros de todas las etapas anteriores, de modo que al
+volver a exportar solo se calculan las etapas cuyos datos de entrada o
+parámetros cambiaron. Los resultados se guardan una sola vez por contenido
+(SHA-256 del PNG) y se enlazan (solo lectura) en outputs/<nombre_base>/.
+
+Opcionalmente cada resultado se guarda también como matriz .npy sin comprimir
+en outputs/.raw/, que otras etapas y procesos pueden mapear en memoria
+(np.load(..., mmap_mode='r')) sin decodificar ni copiar los píxeles.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import time
+
+from PIL import Image
+import numpy as np
+
+
+MANIFEST_NAME = ".manifest.sqlite"
+BLOB_DIR = ".store"
+RAW_DIR = ".raw"
+
+# Permisos de los resultados del almacén (compartidos por enlaces duros)
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+# Política de retención de la caché .npy
+RAW_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+RAW_CACHE_MAX_AGE_DAYS = 30
+
+# Modos que se pueden reconstruir directamente desde la forma de la matriz
+RAW_MODES = ('L', 'RGB', 'RGBA')
+
+
+class ExportStore:
+    """
+    Manifiesto de etapas y almacén de resultados direccionado por contenido.
+
+    Args:
+        root: Carpeta de salida
+        raw_cache: Si es True, guarda también cada resultado como .npy mapeable
+        raw_max_bytes: Tamaño máximo de la caché .npy (se eliminan los menos usados)
+        raw_max_age_days: Días sin uso tras los cuales se elimina un .npy
+    """
+
+    def __init__(self, root="outputs", raw_cache=False,
+                 raw_max_bytes=RAW_CACHE_MAX_BYTES, raw_max_age_days=RAW_CACHE_MAX_AGE_DAYS):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOB_DIR)
+        self.raw_dir = os.path.join(root, RAW_DIR)
+        self.raw_cache = raw_cache
+        self.raw_max_bytes = raw_max_bytes
+        self.raw_max_age_days = raw_max_age_days
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, MANIFEST_NAME))
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS stages (
+                stage_key TEXT PRIMARY KEY,
+                blob TEXT NOT NULL,
+                info TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS directories (
+                name TEXT PRIMARY KEY,
+                source_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS raw_cache (
+                blob TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            """
+        )
+
+    def close(self):
+        if self.raw_cache:
+            self.prune_raw()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def source_hash(img):
+        """
+        SHA-256 del contenido de la imagen: modo, tamaño, píxeles y los datos que
+        cambian su color (paleta y transparencia en imágenes modo P, como GIF).
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode("ascii"))
+        palette = img.getpalette()
+        if palette is not None:
+            digest.update(b"palette:" + bytes(palette))
+        if "transparency" in img.info:
+            digest.update(f"transparency:{img.info['transparency']!r}".encode("ascii", "backslashreplace"))
+        digest.update(b"pixels:")
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def stage_key(parent_key, name, params):
+        """Clave de una etapa: depende de su entrada, su nombre y sus parámetros."""
+        payload = json.dumps([parent_key, name, params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def blob_path(self, blob_hash):
+        return os.path.join(self.blob_dir, blob_hash[:2], f"{blob_hash}.png")
+
+    def raw_path(self, blob_hash):
+        return os.path.join(self.raw_dir, f"{blob_hash}.npy")
+
+    def lookup(self, stage_key):
+        """
+        Busca una etapa ya calculada.
+
+        Returns:
+            tuple: (hash del resultado, info) o None si hay que calcularla
+        """
+        row = self.db.execute(
+            "SELECT blob, info FROM stages WHERE stage_key = ?", (stage_key,)
+        ).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return row[0], json.loads(row[1])
+
+    def save(self, stage_key, img, info):
+        """
+        Guarda el resultado de una etapa. Si otro resultado idéntico ya existe,
+        se reutiliza el mismo archivo.
+
+        Returns:
+            str: Hash SHA-256 del PNG guardado
+        """
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        data = buffer.getvalue()
+        blob_hash = hashlib.sha256(data).hexdigest()
+
+        path = self.blob_path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_path, READ_ONLY)
+            os.replace(tmp_path, path)
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO stages (stage_key, blob, info) VALUES (?, ?, ?)",
+                (stage_key, blob_hash, json.dumps(info, sort_keys=True)),
+            )
+        if self.raw_cache:
+            self.save_raw(blob_hash, img)
+        return blob_hash
+
+    def load(self, blob_hash):
+        """
+        Carga el resultado de una etapa guardada.
+        Si existe en la caché .npy se mapea en memoria en lugar de decodificar el PNG.
+        """
+        arr = self.load_array(blob_hash)
+        if arr is not None:
+            return Image.fromarray(arr)
+
+        img = Image.open(self.blob_path(blob_hash))
+        img.load()
+        if self.raw_cache:
+            self.save_raw(blob_hash, img)
+        return img
+
+    def save_raw(self, blob_hash, img):
+        """
+        Guarda la matriz de píxeles como .npy sin comprimir.
+
+        Returns:
+            str: Ruta del .npy, o None si el modo de la imagen no se admite
+        """
+        if img.mode not in RAW_MODES:
+            return None
+        path = self.raw_path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(self.raw_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(img))
+            os.replace(tmp_path, path)
+        self._touch_raw(blob_hash, os.path.getsize(path))
+        return path
+
+    def ensure_raw(self, blob_hash):
+        """
+        Garantiza que un resultado ya guardado tenga su .npy, decodificando el PNG
+        una sola vez si todavía no existe.
+
+        Returns:
+            str: Ruta del .npy, o None si el modo de la imagen no se admite
+        """
+        path = self.raw_path(blob_hash)
+        if os.path.exists(path):
+            self._touch_raw(blob_hash, os.path.getsize(path))
+            return path
+        with Image.open(self.blob_path(blob_hash)) as img:
+            img.load()
+            return self.save_raw(blob_hash, img)
+
+    def load_array(self, blob_hash):
+        """
+        Mapea en memoria (solo lectura) el .npy de un resultado.
+
+        Returns:
+            np.memmap: Matriz de píxeles, o None si no está en la caché
+        """
+        path = self.raw_path(blob_hash)
+        try:
+            arr = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        self._touch_raw(blob_hash, os.path.getsize(path))
+        return arr
+
+    def _touch_raw(self, blob_hash, size):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO raw_cache (blob, size, last_used) VALUES (?, ?, ?)",
+                (blob_hash, size, time.time()),
+            )
+
+    def prune_raw(self):
+        """
+        Aplica la política de retención de la caché .npy: elimina los archivos sin
+        uso durante más de raw_max_age_days y luego los menos usados recientemente
+        hasta que el total no supere raw_max_bytes.
+
+        Returns:
+            int: Número de archivos eliminados
+        """
+        rows = self.db.execute(
+            "SELECT blob, size, last_used FROM raw_cache ORDER BY last_used DESC"
+        ).fetchall()
+        cutoff = time.time() - self.raw_max_age_days * 86400
+        total = 0
+        expired = []
+        for blob_hash, size, last_used in rows:
+            if last_used < cutoff or total + size > self.raw_max_bytes:
+                expired.append(blob_hash)
+            else:
+                total += size
+
+        for blob_hash in expired:
+            try:
+                os.remove(self.raw_path(blob_hash))
+            except FileNotFoundError:
+                pass
+        with self.db:
+            self.db.executemany("DELETE FROM raw_cache WHERE blob = ?",
+                                [(blob_hash,) for blob_hash in expired])
+        return len(expired)
+
+    def claim_directory(self, base_name, source_hash):
+        """
+        Devuelve la carpeta de salida para una imagen fuente.
+        Si <base_name> ya pertenece a otra imagen con el mismo nombre, o existe
+        una carpeta que el manifiesto no conoce (por ejemplo, de una exportación
+        anterior), se usa <base_name>_<hash corto> para no sobrescribirla.
+        """
+        name = base_name
+        suffix = 1
+        while not self._directory_available(name, source_hash):
+            name = f"{base_name}_{source_hash[:8]}"
+            if suffix > 1:
+                name += f"_{suffix}"
+            suffix += 1
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO directories (name, source_hash) VALUES (?, ?)",
+                (name, source_hash),
+            )
+        output_dir = os.path.join(self.root, name)
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
+
+    def _directory_available(self, name, source_hash):
+        """Una carpeta está libre si es de esta misma fuente, o si no existe o está vacía."""
+        row = self.db.execute(
+            "SELECT source_hash FROM directories WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None:
+            return row[0] == source_hash
+        path = os.path.join(self.root, name)
+        return not os.path.isdir(path) or not os.listdir(path)
+
+    def link(self, blob_hash, dest_path):
+        """
+        Coloca un resultado en la carpeta de salida como enlace duro al almacén,
+        de modo que cada PNG ocupa espacio en disco una sola vez. El archivo del
+        almacén se marca como solo lectura para que no pueda editarse a través
+        del enlace; para modificar un resultado hay que copiarlo primero.
+        Si el sistema de archivos no admite enlaces duros, se copia.
+        """
+        source = self.blob_path(blob_hash)
+        os.chmod(source, READ_ONLY)
+        if os.path.exists(dest_path):
+            if os.path.samefile(source, dest_path):
+                return
+            with open(dest_path, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() == blob_hash:
+                    return
+            os.chmod(dest_path, stat.S_IWRITE | stat.S_IREAD)
+            os.remove(dest_path)
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            shutil.copyfile(source, dest_path)
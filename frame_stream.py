@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Procesamiento de Secuencias Multi-cuadro
+Aplica las transformaciones y el cálculo de área cuadro por cuadro a GIF
+animados y TIFF multipágina.
+
+Los cuadros se leen de forma perezosa con ImageSequence y se escriben en
+cuanto se procesan, de modo que la memoria usada no depende del número de
+cuadros. Opcionalmente los cuadros se reparten entre varios procesos.
+"""
+
+import argparse
+import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageSequence, TiffImagePlugin
+import numpy as np
+
+from image_ops import binarize_stack, contrast_stack, grayscale_stack, otsu_thresholds
+
+
+TRANSFORMS = ("grayscale", "contrast", "invert", "rotate", "resize", "binarize")
+
+DEFAULT_PARAMS = {
+    "angle": 25.0,
+    "alpha": 1.2,
+    "beta": 10.0,
+    "method": "otsu",
+    "threshold": 128,
+    "object_is_white": True,
+    "ppu": 0.0,
+}
+
+# Cuadros en vuelo por proceso al paralelizar (limita la memoria usada)
+FRAMES_PER_WORKER = 2
+
+CSV_COLUMNS = ["cuadro", "umbral_otsu", "area_px", "area_cm2"]
+
+# Formatos de salida multi-cuadro admitidos (extensión -> formato de Pillow)
+OUTPUT_FORMATS = {".tif": "TIFF", ".tiff": "TIFF", ".gif": "GIF"}
+
+
+def parse_transforms(text):
+    """
+    Convierte una lista separada por comas en la secuencia de transformaciones.
+
+    Raises:
+        ValueError: Si alguna transformación no existe
+    """
+    ops = [op.strip() for op in text.split(",") if op.strip()]
+    unknown = [op for op in ops if op not in TRANSFORMS]
+    if unknown:
+        raise ValueError(f"Transformación desconocida: {', '.join(unknown)}. "
+                         f"Disponibles: {', '.join(TRANSFORMS)}")
+    return ops
+
+
+def check_output_format(path):
+    """
+    Verifica que el archivo de salida sea TIFF o GIF antes de procesar cuadros.
+
+    Raises:
+        ValueError: Si la extensión no admite varios cuadros
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de salida no admitido: '{ext or path}'. "
+                         f"Use {', '.join(OUTPUT_FORMATS)} (se recomienda .tif)")
+    return OUTPUT_FORMATS[ext]
+
+
+def iter_frames(img):
+    """
+    Recorre los cuadros de una imagen de forma perezosa.
+    Cada cuadro se entrega en modo L o RGB; los cuadros de 16 bits se reducen
+    a 8 bits conservando los 8 bits más significativos.
+    """
+    for frame in ImageSequence.Iterator(img):
+        if frame.mode in ('I;16', 'I;16L', 'I;16B'):
+            arr = np.asarray(frame, dtype=np.uint16) >> 8
+            yield Image.fromarray(arr.astype(np.uint8), mode='L')
+        elif frame.mode in ('L', 'RGB'):
+            yield frame.copy()
+        else:
+            yield frame.convert('RGB')
+
+
+def apply_transforms(img, ops, params):
+    """Aplica en orden las transformaciones elegidas a un cuadro."""
+    for op in ops:
+        if op == "grayscale":
+            arr = np.asarray(img.convert('RGB'))
+            img = Image.fromarray(grayscale_stack(arr[None])[0], mode='L')
+        elif op == "contrast":
+            arr = np.asarray(img.convert('L'))
+            img = Image.fromarray(contrast_stack(arr, params["alpha"], params["beta"]), mode='L')
+        elif op == "invert":
+            img = Image.fromarray(255 - np.asarray(img))
+        elif op == "rotate":
+            img = img.rotate(params["angle"], expand=True, resample=Image.Resampling.BICUBIC)
+        elif op == "resize":
+            img = img.resize((img.width // 2, img.height // 2), Image.Resampling.LANCZOS)
+        elif op == "binarize":
+            arr = np.asarray(img.convert('L'))[None]
+            if params["method"] == "otsu":
+                threshold = otsu_thresholds(arr)
+            else:
+                threshold = params["threshold"]
+            img = Image.fromarray(binarize_stack(arr, threshold)[0], mode='L')
+    return img
+
+
+def measure_area(img, object_is_white, ppu):
+    """
+    Binariza el cuadro con Otsu y calcula el área del objeto.
+
+    Returns:
+        tuple: (umbral de Otsu, área en píxeles, área en cm² o None)
+    """
+    arr = np.asarray(img.convert('L'))
+    threshold = int(otsu_thresholds(arr[None])[0])
+    if object_is_white:
+        pixel_area = int(np.count_nonzero(arr > threshold))
+    else:
+        pixel_area = int(np.count_nonzero(arr <= threshold))
+    area_cm2 = pixel_area / (ppu * ppu) if ppu > 0 else None
+    return threshold, pixel_area, area_cm2
+
+
+def process_frame(img, ops, params):
+    """Transforma un cuadro y mide su área."""
+    result = apply_transforms(img, ops, params)
+    return result, measure_area(result, params["object_is_white"], params["ppu"])
+
+
+class FrameWriter:
+    """
+    Escribe un archivo multi-cuadro a medida que llegan los cuadros.
+    En TIFF cada página se agrega directamente al archivo; otros formatos
+    (como GIF) requieren que Pillow reciba todos los cuadros al final.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.streaming = check_output_format(path) == "TIFF"
+        self.frames = []
+        self.count = 0
+        self.tiff = TiffImagePlugin.AppendingTiffWriter(path, new=True) if self.streaming else None
+
+    def write(self, img):
+        if self.streaming:
+            img.save(self.tiff, format='TIFF')
+            self.tiff.newFrame()
+        else:
+            self.frames.append(img)
+        self.count += 1
+
+    def close(self):
+        if self.streaming:
+            self.tiff.close()
+        elif self.frames:
+            self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:])
+            self.frames = []
+
+
+def _results(frames, ops, params, workers):
+    """Procesa los cuadros en orden, con a lo sumo workers × FRAMES_PER_WORKER en vuelo."""
+    if workers <= 1:
+        for frame in frames:
+            yield process_frame(frame, ops, params)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for frame in frames:
+            pending.append(executor.submit(process_frame, frame, ops, params))
+            if len(pending) >= workers * FRAMES_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def process_stack(input_path, output_path, csv_path, ops, params=None, workers=1, progress=None,
+                  cancel=None):
+    """
+    Procesa todos los cuadros de un GIF o TIFF multipágina.
+
+    Args:
+        input_path: Archivo de entrada
+        output_path: Archivo multi-cuadro de salida (.tif recomendado)
+        csv_path: Serie temporal de área por cuadro
+        ops: Lista de transformaciones a aplicar (ver TRANSFORMS)
+        params: Parámetros de las transformaciones y del cálculo de área
+        workers: Número de procesos (1 = secuencial)
+        progress: Función opcional llamada con el número de cuadros procesados
+        cancel: threading.Event opcional; si se activa, se detiene tras el cuadro
+            actual y se conservan los cuadros ya escritos
+
+    Returns:
+        int: Número de cuadros procesados
+    """
+    check_output_format(output_path)
+    params = {**DEFAULT_PARAMS, **(params or {})}
+
+    with Image.open(input_path) as img, open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        series = csv.writer(f)
+        series.writerow(CSV_COLUMNS)
+        writer = FrameWriter(output_path)
+        results = _results(iter_frames(img), ops, params, workers)
+        try:
+            for index, (result, (threshold, pixel_area, area_cm2)) in enumerate(results):
+                writer.write(result)
+                series.writerow([index, threshold, pixel_area,
+                                 f"{area_cm2:.4f}" if area_cm2 is not None else ""])
+                if progress is not None:
+                    progress(index + 1)
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            results.close()
+            writer.close()
+    return writer.count
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Procesa GIF animados y TIFF multipágina cuadro por cuadro")
+    parser.add_argument("entrada", help="GIF o TIFF multipágina")
+    parser.add_argument("salida", help="Archivo multi-cuadro de salida (.tif recomendado)")
+    parser.add_argument("--csv", help="Serie temporal de área (por defecto: <salida>_area.csv)")
+    parser.add_argument("--transforms", default="grayscale",
+                        help=f"Transformaciones separadas por comas: {', '.join(TRANSFORMS)}")
+    parser.add_argument("--angle", type=float, default=DEFAULT_PARAMS["angle"])
+    parser.add_argument("--alpha", type=float, default=DEFAULT_PARAMS["alpha"])
+    parser.add_argument("--beta", type=float, default=DEFAULT_PARAMS["beta"])
+    parser.add_argument("--method", choices=("otsu", "fixed"), default=DEFAULT_PARAMS["method"])
+    parser.add_argument("--threshold", type=int, default=DEFAULT_PARAMS["threshold"])
+    parser.add_argument("--objeto", choices=("blanco", "negro"), default="blanco")
+    parser.add_argument("--ppu", type=float, default=0.0, help="Píxeles por cm para el área en cm²")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos en paralelo (por defecto: 1)")
+    args = parser.parse_args()
+
+    try:
+        ops = parse_transforms(args.transforms)
+        check_output_format(args.salida)
+    except ValueError as e:
+        parser.error(str(e))
+
+    csv_path = args.csv or f"{os.path.splitext(args.salida)[0]}_area.csv"
+    params = {
+        "angle": args.angle,
+        "alpha": args.alpha,
+        "beta": args.beta,
+        "method": args.method,
+        "threshold": args.threshold,
+        "object_is_white": args.objeto == "blanco",
+        "ppu": args.ppu,
+    }
+    count = process_stack(args.entrada, args.salida, csv_path, ops, params, args.workers)
+    print(f"{count} cuadros procesados -> {args.salida}, {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
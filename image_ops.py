@@ -0,0 +1,92 @@
+"""
+Operaciones Matriciales Compartidas
+Núcleos NumPy usados por la GUI, el servicio local y el procesamiento de
+secuencias. Operan sobre pilas de imágenes (N×H×W o N×H×W×3) para que una
+sola llamada procese varias imágenes del mismo tamaño.
+"""
+
+import numpy as np
+
+
+# Pesos de la combinación lineal RGB -> gris (igual que en la GUI)
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+def between_class_variance(histograms):
+    """
+    Evalúa la varianza entre clases de Otsu para los 256 umbrales a la vez.
+
+    Args:
+        histograms: Array NumPy de forma (N, 256) con un histograma por imagen
+
+    Returns:
+        np.ndarray: Varianza entre clases σ²(t) de forma (N, 256); vale 0 en los
+        umbrales que dejan vacío el fondo o el frente
+    """
+    prob = histograms / histograms.sum(axis=1, keepdims=True)
+
+    bins = np.arange(256)
+    weight_background = np.cumsum(prob, axis=1)
+    sum_background = np.cumsum(bins * prob, axis=1)
+    mean_global = sum_background[:, -1:]
+    weight_foreground = 1 - weight_background
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_background = sum_background / weight_background
+        mean_foreground = (mean_global - sum_background) / weight_foreground
+        variance_between = (weight_background * weight_foreground *
+                            (mean_background - mean_foreground) ** 2)
+
+    # Umbrales sin píxeles en el fondo o en el frente no son válidos
+    valid = (weight_background > 0) & (weight_foreground > 1e-12)
+    return np.where(valid, variance_between, 0)
+
+
+def otsu_thresholds(stack):
+    """
+    Calcula el umbral de Otsu de cada imagen de una pila en escala de grises.
+    Los histogramas de todas las imágenes se obtienen con un solo bincount.
+
+    Args:
+        stack: Array NumPy uint8 de forma (N, H, W)
+
+    Returns:
+        np.ndarray: Umbral óptimo de cada imagen (N,)
+    """
+    n = stack.shape[0]
+    offsets = (np.arange(n, dtype=np.int64) * 256)[:, None]
+    flat = stack.reshape(n, -1).astype(np.int64) + offsets
+    histograms = np.bincount(flat.ravel(), minlength=n * 256).reshape(n, 256)
+    return between_class_variance(histograms).argmax(axis=1)
+
+
+def binarize_stack(stack, thresholds):
+    """Aplica la función escalón a cada imagen con su propio umbral."""
+    thresholds = np.asarray(thresholds).reshape(-1, 1, 1)
+    return (stack > thresholds).astype(np.uint8) * 255
+
+
+def grayscale_stack(stack):
+    """Proyecta una pila RGB (N×H×W×3) sobre el vector de pesos de gris."""
+    gray = np.dot(stack.astype(np.float32), GRAY_WEIGHTS)
+    return np.clip(gray, 0, 255).astype(np.uint8)
+
+
+def contrast_stack(stack, alpha, beta):
+    """Transformación afín I' = α·I + β sobre toda la pila."""
+    adjusted = alpha * stack.astype(np.float32) + beta
+    return np.clip(adjusted, 0, 255).astype(np.uint8)
+
+
+def area_stack(stack, object_is_white, threshold):
+    """
+    Calcula el área en píxeles de cada imagen de la pila.
+    Las imágenes que no son binarias (solo 0 y 255) se binarizan con el umbral fijo.
+    """
+    not_binary = ((stack != 0) & (stack != 255)).any(axis=(1, 2))
+    binary = np.where(not_binary[:, None, None], binarize_stack(stack, threshold), stack)
+    if object_is_white:
+        mask = binary > 127
+    else:
+        mask = binary <= 127
+    return mask.sum(axis=(1, 2)), not_binary
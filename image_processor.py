@@ -4,13 +4,20 @@ Procesador de Imágenes - Álgebra Lineal
 Aplicación simple para aplicar transformaciones matemáticas a imágenes.
 """
 
+import json
 import os
+import threading
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 from tkinter.filedialog import askopenfilename, asksaveasfilename
+from datetime import datetime
 from PIL import Image, ImageTk
 import numpy as np
 
+from export_store import ExportStore
+from frame_stream import check_output_format, parse_transforms, process_stack
+from image_ops import between_class_variance, grayscale_stack
+
 
 class ImageProcessor:
     """Aplicación para procesar imágenes con álgebra lineal."""
@@ -26,12 +33,21 @@ class ImageProcessor:
         self.processed_image = None
         self.image_path = None
         
+        # Histograma acumulado de la imagen actual (se calcula una vez por imagen)
+        self.threshold_cache = None
+        # (imagen binarizada, umbral) para calcular su área sin recontar píxeles
+        self.binary_source = None
+        self.threshold_window = None
+        
         # Parámetros de transformación
         self.rotation_angle = tk.DoubleVar(value=25.0)
         self.contrast_alpha = tk.DoubleVar(value=1.2)
         self.brightness_beta = tk.DoubleVar(value=10.0)
         self.threshold_value = tk.IntVar(value=128)
         self.binarization_method = tk.StringVar(value="otsu")  # "otsu" o "fixed"
+        self.raw_intermediates = tk.BooleanVar(value=False)  # Guardar intermedios .npy al exportar
+        self.object_is_white = tk.BooleanVar(value=True)  # Objeto a medir en el explorador de umbral
+        self.ppu_text = tk.StringVar(value="")  # PPU opcional para el área en cm²
         
         self.setup_ui()
     
@@ -158,6 +174,10 @@ class ImageProcessor:
                       bg="#34495e", fg="#ecf0f1", selectcolor="#2c3e50", font=("Arial", 9)).pack(side=tk.LEFT)
         tk.Entry(bin_frame, textvariable=self.threshold_value, width=6, font=("Arial", 9)).pack(side=tk.LEFT, padx=2)
         
+        # Formato de intermedios del pipeline
+        tk.Checkbutton(params_frame, text="Intermedios .npy", variable=self.raw_intermediates,
+                       bg="#34495e", fg="#ecf0f1", selectcolor="#2c3e50", font=("Arial", 9)).pack(side=tk.LEFT, padx=10)
+        
         # Botones de transformación
         button_frame = tk.Frame(control_frame, bg="#34495e")
         button_frame.pack(pady=10)
@@ -171,7 +191,9 @@ class ImageProcessor:
             ("Contraste/Brillo", self.adjust_contrast_brightness_ui, "#8e44ad"),
             ("Calcular Área", self.calculate_area, "#16a085"),
             ("Área desde Archivo...", self.calculate_area_from_file, "#27ae60"),
-            ("Exportar Pipeline", self.export_pipeline, "#d35400")
+            ("Exportar Pipeline", self.export_pipeline, "#d35400"),
+            ("Procesar Secuencia...", self.process_sequence, "#2980b9"),
+            ("Explorar Umbral...", self.explore_threshold, "#7f8c8d")
         ]
         
         for i, (text, command, color) in enumerate(buttons):
@@ -192,7 +214,7 @@ class ImageProcessor:
         file_path = askopenfilename(
             title="Seleccionar Imagen",
             filetypes=[
-                ("Imágenes", "*.png *.jpg *.jpeg *.bmp *.gif"),
+                ("Imágenes", "*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff"),
                 ("Todos", "*.*")
             ],
             initialdir=os.path.expanduser("~")
@@ -205,6 +227,8 @@ class ImageProcessor:
             self.image_path = file_path
             self.current_image = Image.open(file_path)
             self.processed_image = None
+            self.threshold_cache = None
+            self.binary_source = None
             
             # Mostrar imagen original
             self.display_image(self.current_image, self.original_label)
@@ -212,7 +236,19 @@ class ImageProcessor:
             # Limpiar imagen procesada
             self.processed_label.config(image='', text="Aplicar transformación")
             
-            messagebox.showinfo("Éxito", "Imagen cargada correctamente")
+            if self.threshold_window is not None:
+                self.draw_variance_curve()
+            
+            n_frames = getattr(self.current_image, "n_frames", 1)
+            if n_frames > 1:
+                messagebox.showinfo(
+                    "Éxito",
+                    f"Imagen cargada correctamente ({n_frames} cuadros).\n\n"
+                    "Las transformaciones usan el primer cuadro; use \"Procesar Secuencia...\" "
+                    "para procesar todos."
+                )
+            else:
+                messagebox.showinfo("Éxito", "Imagen cargada correctamente")
             
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo cargar la imagen:\n{str(e)}")
@@ -246,6 +282,10 @@ class ImageProcessor:
         self.current_image = None
         self.processed_image = None
         self.image_path = None
+        self.threshold_cache = None
+        self.binary_source = None
+        
+        self.close_threshold_explorer()
         
         self.original_label.config(image='', text="No hay imagen")
         self.processed_label.config(image='', text="Aplicar transformación")
@@ -289,14 +329,10 @@ class ImageProcessor:
                 img = img.convert('RGB')
             
             # Matriz de la imagen
-            arr = np.array(img, dtype=np.float32)
+            arr = np.asarray(img)
             
-            # Vector de pesos para la proyección (combinación lineal)
-            weights = np.array([0.299, 0.587, 0.114])
-            
-            # Aplicar producto punto
-            gray = np.dot(arr, weights)
-            gray = np.clip(gray, 0, 255).astype(np.uint8)
+            # Producto punto con el vector de pesos GRAY_WEIGHTS (combinación lineal)
+            gray = grayscale_stack(arr[None])[0]
             
             self.processed_image = Image.fromarray(gray, mode='L')
             self.display_image(self.processed_image, self.processed_label)
@@ -320,7 +356,7 @@ class ImageProcessor:
             
             # Seleccionar método de binarización
             if self.binarization_method.get() == "otsu":
-                threshold = self.otsu_threshold(arr)
+                threshold = self.get_threshold_cache()["otsu"]
             else:
                 threshold = self.threshold_value.get()
             
@@ -328,6 +364,7 @@ class ImageProcessor:
             binary = (arr > threshold).astype(np.uint8) * 255
             
             self.processed_image = Image.fromarray(binary, mode='L')
+            self.binary_source = (self.processed_image, threshold)
             self.display_image(self.processed_image, self.processed_label)
             
         except Exception as e:
@@ -336,7 +373,7 @@ class ImageProcessor:
     def otsu_threshold(self, gray_array):
         """
         Calcula el umbral óptimo usando el método de Otsu.
-        Maximiza la varianza entre clases.
+        Maximiza la varianza entre clases, evaluada para los 256 umbrales a la vez.
         
         Args:
             gray_array: Array NumPy de imagen en escala de grises
@@ -345,50 +382,200 @@ class ImageProcessor:
             int: Umbral óptimo
         """
         # Calcular histograma (256 bins para 0-255)
-        histogram, _ = np.histogram(gray_array.flatten(), bins=256, range=(0, 256))
-        histogram = histogram.astype(float)
+        histogram = np.bincount(np.asarray(gray_array, dtype=np.uint8).ravel(), minlength=256)
+        
+        # Varianza entre clases para cada umbral posible; el óptimo es su máximo
+        return int(between_class_variance(histogram[None])[0].argmax())
+    
+    def get_threshold_cache(self):
+        """
+        Calcula una sola vez por imagen el histograma acumulado, la curva de
+        varianza entre clases de Otsu y una versión reducida para la vista previa.
+        
+        Con el histograma acumulado H, el área para cualquier umbral t es:
+        objeto negro = H[t], objeto blanco = total - H[t]
+        """
+        if self.threshold_cache is None:
+            gray_img = self.current_image.convert('L')
+            arr = np.asarray(gray_img)
+            histogram = np.bincount(arr.ravel(), minlength=256)
+            variance = between_class_variance(histogram[None])[0]
+            
+            # Proxy reducido al tamaño de la vista previa
+            proxy = gray_img.copy()
+            proxy.thumbnail((350, 250), Image.Resampling.LANCZOS)
+            
+            self.threshold_cache = {
+                "cumulative": np.cumsum(histogram),
+                "variance": variance,
+                "otsu": int(variance.argmax()),
+                "proxy": np.asarray(proxy),
+            }
+        return self.threshold_cache
+    
+    def area_at_threshold(self, threshold, object_is_white):
+        """Área en píxeles de la imagen actual binarizada con el umbral dado (O(1))."""
+        cumulative = self.get_threshold_cache()["cumulative"]
+        # Fuera de 0-255 todos los píxeles quedan del mismo lado del umbral
+        if threshold < 0:
+            black = 0
+        elif threshold > 255:
+            black = int(cumulative[-1])
+        else:
+            black = int(cumulative[threshold])
+        if object_is_white:
+            return int(cumulative[-1]) - black
+        return black
+    
+    def explore_threshold(self):
+        """
+        Abre una ventana con un deslizador de umbral que muestra al instante el
+        área (píxeles y cm²) y la curva de varianza entre clases de Otsu.
+        La vista previa se binariza sobre la versión reducida de la imagen.
+        """
+        if not self.check_image_loaded():
+            return
         
-        # Normalizar histograma (probabilidades)
-        total_pixels = gray_array.size
-        prob = histogram / total_pixels
+        if self.threshold_window is not None:
+            self.threshold_window.lift()
+            return
         
-        # Calcular media global
-        bins = np.arange(256)
-        mean_global = np.sum(bins * prob)
+        try:
+            self.get_threshold_cache()
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al procesar:\n{str(e)}")
+            return
         
-        # Inicializar variables
-        max_variance = 0
-        optimal_threshold = 0
+        win = tk.Toplevel(self.root)
+        win.title("Explorar Umbral")
+        win.configure(bg="#34495e")
+        win.protocol("WM_DELETE_WINDOW", self.close_threshold_explorer)
+        self.threshold_window = win
         
-        # Probar cada umbral posible
-        weight_background = 0
-        sum_background = 0
+        self.variance_canvas = tk.Canvas(win, width=512, height=160, bg="#2c3e50", highlightthickness=0)
+        self.variance_canvas.pack(padx=10, pady=(10, 5))
         
-        for t in range(256):
-            # Peso y suma acumulada para el fondo (clase 0)
-            weight_background += prob[t]
-            sum_background += t * prob[t]
-            
-            # Si no hay píxeles en el fondo o en el frente, continuar
-            if weight_background == 0 or weight_background == 1:
-                continue
-            
-            weight_foreground = 1 - weight_background
-            
-            # Media de cada clase
-            mean_background = sum_background / weight_background
-            mean_foreground = (mean_global - sum_background) / weight_foreground
-            
-            # Varianza entre clases
-            variance_between = (weight_background * weight_foreground * 
-                              (mean_background - mean_foreground) ** 2)
-            
-            # Actualizar si encontramos una mejor varianza
-            if variance_between > max_variance:
-                max_variance = variance_between
-                optimal_threshold = t
+        tk.Scale(
+            win,
+            from_=0,
+            to=255,
+            orient=tk.HORIZONTAL,
+            length=512,
+            variable=self.threshold_value,
+            command=self.on_threshold_change,
+            bg="#34495e",
+            fg="#ecf0f1",
+            highlightthickness=0,
+            label="Umbral"
+        ).pack(padx=10)
+        
+        options_frame = tk.Frame(win, bg="#34495e")
+        options_frame.pack(pady=5)
+        tk.Radiobutton(options_frame, text="Objeto blanco", variable=self.object_is_white, value=True,
+                       command=self.on_threshold_change, bg="#34495e", fg="#ecf0f1",
+                       selectcolor="#2c3e50", font=("Arial", 9)).pack(side=tk.LEFT)
+        tk.Radiobutton(options_frame, text="Objeto negro", variable=self.object_is_white, value=False,
+                       command=self.on_threshold_change, bg="#34495e", fg="#ecf0f1",
+                       selectcolor="#2c3e50", font=("Arial", 9)).pack(side=tk.LEFT)
+        tk.Label(options_frame, text="PPU:", bg="#34495e", fg="#ecf0f1", font=("Arial", 9)).pack(side=tk.LEFT, padx=(10, 0))
+        ppu_entry = tk.Entry(options_frame, textvariable=self.ppu_text, width=8, font=("Arial", 9))
+        ppu_entry.pack(side=tk.LEFT, padx=2)
+        ppu_entry.bind("<KeyRelease>", self.on_threshold_change)
+        
+        self.threshold_info = tk.Label(win, bg="#34495e", fg="#ecf0f1", font=("Arial", 10), justify=tk.LEFT)
+        self.threshold_info.pack(pady=5)
         
-        return optimal_threshold
+        # Vista previa propia: no reemplaza el resultado procesado de la ventana principal
+        self.threshold_preview = tk.Label(win, bg="#7f8c8d")
+        self.threshold_preview.pack(padx=10, pady=5)
+        
+        tk.Button(
+            win,
+            text="Aplicar a imagen completa",
+            command=self.apply_explored_threshold,
+            bg="#f39c12",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            pady=5
+        ).pack(pady=(0, 10))
+        
+        self.draw_variance_curve()
+    
+    def close_threshold_explorer(self):
+        """Cierra la ventana del explorador de umbral."""
+        if self.threshold_window is not None:
+            self.threshold_window.destroy()
+            self.threshold_window = None
+    
+    def draw_variance_curve(self):
+        """Dibuja la curva σ²(t) de Otsu de la imagen actual en el explorador."""
+        canvas = self.variance_canvas
+        canvas.delete("all")
+        width, height = int(canvas["width"]), int(canvas["height"])
+        
+        cache = self.get_threshold_cache()
+        variance = cache["variance"]
+        peak = variance.max() or 1
+        
+        points = []
+        for t, value in enumerate(variance):
+            points.extend((t * width / 255, height - 5 - value / peak * (height - 10)))
+        canvas.create_line(*points, fill="#1abc9c", width=2)
+        
+        # Umbral de Otsu (máximo de la curva)
+        otsu_x = cache["otsu"] * width / 255
+        canvas.create_line(otsu_x, 0, otsu_x, height, fill="#9b59b6", dash=(4, 2))
+        canvas.create_text(otsu_x + 4, 10, text=f"Otsu = {cache['otsu']}", anchor=tk.W,
+                           fill="#9b59b6", font=("Arial", 9))
+        
+        self.threshold_marker = canvas.create_line(0, 0, 0, height, fill="#f39c12", width=2)
+        self.on_threshold_change()
+    
+    def apply_explored_threshold(self):
+        """
+        Binariza la imagen completa con el umbral del deslizador.
+        Es el único punto donde el explorador cambia el método a umbral fijo
+        (Tk ejecuta el comando del Scale al dibujarlo, aunque no se haya movido).
+        """
+        self.binarization_method.set("fixed")
+        self.binarize()
+    
+    def on_threshold_change(self, _event=None):
+        """Actualiza área, varianza y vista previa para el umbral del deslizador."""
+        if self.current_image is None or self.threshold_window is None:
+            return
+        
+        try:
+            threshold = self.threshold_value.get()
+        except tk.TclError:
+            return  # Umbral no numérico en la entrada
+        cache = self.get_threshold_cache()
+        object_is_white = self.object_is_white.get()
+        curve_t = min(max(threshold, 0), 255)
+        
+        pixel_area = self.area_at_threshold(threshold, object_is_white)
+        total = int(cache["cumulative"][-1])
+        info = f"Umbral: {threshold}    Área: {pixel_area} px ({100 * pixel_area / total:.2f}%)"
+        
+        try:
+            ppu = float(self.ppu_text.get().strip())
+        except ValueError:
+            ppu = 0
+        if ppu > 0:
+            info += f"    {pixel_area / (ppu * ppu):.4f} cm²"
+        
+        info += f"\nσ²(t) = {cache['variance'][curve_t]:.2f}    (Otsu: {cache['otsu']})"
+        self.threshold_info.config(text=info)
+        
+        width, height = int(self.variance_canvas["width"]), int(self.variance_canvas["height"])
+        x = curve_t * width / 255
+        self.variance_canvas.coords(self.threshold_marker, x, 0, x, height)
+        
+        # Vista previa sobre la versión reducida
+        binary = (cache["proxy"] > threshold).astype(np.uint8) * 255
+        photo = ImageTk.PhotoImage(Image.fromarray(binary, mode='L'))
+        self.threshold_preview.config(image=photo)
+        self.threshold_preview.image = photo
     
     def rotate_90(self):
         """
@@ -528,12 +715,16 @@ class ImageProcessor:
             object_is_white = response
             
             # Calcular área en píxeles
-            if object_is_white:
-                mask = (arr > 127)  # Píxeles blancos
+            if self.binary_source is not None and self.binary_source[0] is self.processed_image:
+                # Binarización de la imagen actual: el área sale del histograma acumulado
+                pixel_area = self.area_at_threshold(self.binary_source[1], object_is_white)
             else:
-                mask = (arr <= 127)  # Píxeles negros
-            
-            pixel_area = int(mask.sum())
+                if object_is_white:
+                    mask = (arr > 127)  # Píxeles blancos
+                else:
+                    mask = (arr <= 127)  # Píxeles negros
+                
+                pixel_area = int(mask.sum())
             
             # Preguntar si quiere convertir a cm²
             ppu_input = tk.simpledialog.askstring(
@@ -564,7 +755,8 @@ class ImageProcessor:
     def calculate_area_from_file(self):
         """
         Calcula el área desde un archivo de imagen binaria externa.
-        Soporta imágenes en modo L o 1 (binaria).
+        Soporta imágenes en modo L o 1 (binaria) y matrices .npy, que se mapean
+        en memoria sin decodificar.
         """
         try:
             # Abrir diálogo para seleccionar archivo
@@ -572,6 +764,7 @@ class ImageProcessor:
                 title="Seleccionar Imagen Binaria",
                 filetypes=[
                     ("Imágenes", "*.png *.jpg *.jpeg *.bmp *.gif"),
+                    ("Matrices NumPy", "*.npy"),
                     ("Todos", "*.*")
                 ],
                 initialdir=os.path.expanduser("~")
@@ -580,17 +773,23 @@ class ImageProcessor:
             if not file_path:
                 return
             
-            # Cargar imagen
-            img = Image.open(file_path)
-            
-            # Convertir a L si es modo 1
-            if img.mode == '1':
-                img = img.convert('L')
-            elif img.mode != 'L':
-                # Si no es binaria, convertir a L
-                img = img.convert('L')
-            
-            arr = np.array(img, dtype=np.uint8)
+            if file_path.lower().endswith('.npy'):
+                # Intermedio del pipeline: mapear en memoria sin copiar
+                arr = np.load(file_path, mmap_mode='r')
+                if arr.ndim != 2 or arr.dtype != np.uint8:
+                    arr = np.asarray(Image.fromarray(np.asarray(arr, dtype=np.uint8)).convert('L'))
+            else:
+                # Cargar imagen
+                img = Image.open(file_path)
+                
+                # Convertir a L si es modo 1
+                if img.mode == '1':
+                    img = img.convert('L')
+                elif img.mode != 'L':
+                    # Si no es binaria, convertir a L
+                    img = img.convert('L')
+                
+                arr = np.array(img, dtype=np.uint8)
             
             # Verificar si es binaria (solo 0 y 255)
             unique_values = np.unique(arr)
@@ -655,6 +854,9 @@ class ImageProcessor:
         """
         Exporta el pipeline completo de transformaciones aplicadas a la imagen actual.
         Guarda todas las transformaciones intermedias en outputs/<nombre_base>/.
+        Las etapas cuyo contenido de entrada y parámetros no cambiaron se reutilizan
+        desde el manifiesto (outputs/.manifest.sqlite) en lugar de recalcularse.
+        Con "Intermedios .npy" activo, cada etapa se guarda también en outputs/.raw/.
         """
         if self.current_image is None:
             messagebox.showwarning("Advertencia", "Primero carga una imagen")
@@ -667,10 +869,6 @@ class ImageProcessor:
             else:
                 base_name = "imagen"
             
-            # Crear directorio de salida
-            output_dir = os.path.join("outputs", base_name)
-            os.makedirs(output_dir, exist_ok=True)
-            
             # Obtener parámetros
             angle = self.rotation_angle.get()
             alpha = self.contrast_alpha.get()
@@ -678,83 +876,278 @@ class ImageProcessor:
             threshold = self.threshold_value.get()
             bin_method = self.binarization_method.get()
             
-            # Lista para metadata
-            metadata = []
-            metadata.append(f"Pipeline de Transformaciones - {base_name}")
-            metadata.append(f"Fecha: {os.popen('date').read().strip()}")
-            metadata.append(f"\nParámetros utilizados:")
-            metadata.append(f"- Ángulo de rotación: {angle}°")
-            metadata.append(f"- Contraste (α): {alpha}")
-            metadata.append(f"- Brillo (β): {beta}")
-            metadata.append(f"- Método de binarización: {bin_method}")
-            metadata.append(f"- Umbral fijo: {threshold}")
-            metadata.append(f"\nArchivos generados:")
-            
-            # 00 - Original
-            orig_path = os.path.join(output_dir, "00_original.png")
-            self.current_image.save(orig_path)
-            metadata.append(f"- 00_original.png")
-            
-            # 01 - Rotada
-            rotated = self.current_image.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
-            rot_path = os.path.join(output_dir, "01_rotada.png")
-            rotated.save(rot_path)
-            metadata.append(f"- 01_rotada.png (ángulo: {angle}°)")
-            
-            # 02 - Redimensionada (50%)
-            width, height = rotated.size
-            new_size = (width // 2, height // 2)
-            resized = rotated.resize(new_size, Image.Resampling.LANCZOS)
-            res_path = os.path.join(output_dir, "02_resized.png")
-            resized.save(res_path)
-            metadata.append(f"- 02_resized.png (50% del tamaño)")
-            
-            # 03 - Contraste/Brillo
-            gray_for_contrast = resized.convert('L')
-            arr_contrast = np.array(gray_for_contrast, dtype=np.float32)
-            adjusted = alpha * arr_contrast + beta
-            adjusted = np.clip(adjusted, 0, 255).astype(np.uint8)
-            contrast_img = Image.fromarray(adjusted, mode='L')
-            con_path = os.path.join(output_dir, "03_contraste.png")
-            contrast_img.save(con_path)
-            metadata.append(f"- 03_contraste.png (α={alpha}, β={beta})")
-            
-            # 04 - Escala de grises
-            gray_img = contrast_img  # Ya está en L
-            gray_path = os.path.join(output_dir, "04_grises.png")
-            gray_img.save(gray_path)
-            metadata.append(f"- 04_grises.png")
-            
-            # 05 - Binaria Otsu
-            arr_gray = np.array(gray_img)
-            threshold_otsu = self.otsu_threshold(arr_gray)
-            binary_otsu = (arr_gray > threshold_otsu).astype(np.uint8) * 255
-            otsu_img = Image.fromarray(binary_otsu, mode='L')
-            otsu_path = os.path.join(output_dir, "05_binaria_otsu.png")
-            otsu_img.save(otsu_path)
-            metadata.append(f"- 05_binaria_otsu.png (umbral Otsu: {threshold_otsu})")
-            
-            # 06 - Binaria umbral fijo
-            binary_fixed = (arr_gray > threshold).astype(np.uint8) * 255
-            fixed_img = Image.fromarray(binary_fixed, mode='L')
-            fixed_path = os.path.join(output_dir, "06_binaria_umbral.png")
-            fixed_img.save(fixed_path)
-            metadata.append(f"- 06_binaria_umbral.png (umbral fijo: {threshold})")
-            
-            # Guardar metadata
-            metadata_path = os.path.join(output_dir, "metadata.txt")
+            def rotate(get):
+                return get("original").rotate(angle, expand=True, resample=Image.Resampling.BICUBIC), {}
+            
+            def resize(get):
+                width, height = get("rotada").size
+                return get("rotada").resize((width // 2, height // 2), Image.Resampling.LANCZOS), {}
+            
+            def contrast(get):
+                arr = np.array(get("resized").convert('L'), dtype=np.float32)
+                adjusted = np.clip(alpha * arr + beta, 0, 255).astype(np.uint8)
+                return Image.fromarray(adjusted, mode='L'), {}
+            
+            def grayscale(get):
+                return get("contraste"), {}  # Ya está en L
+            
+            def binarize_otsu(get):
+                arr = np.asarray(get("grises"))
+                threshold_otsu = self.otsu_threshold(arr)
+                binary = (arr > threshold_otsu).astype(np.uint8) * 255
+                return Image.fromarray(binary, mode='L'), {"umbral_otsu": int(threshold_otsu)}
+            
+            def binarize_fixed(get):
+                arr = np.asarray(get("grises"))
+                binary = (arr > threshold).astype(np.uint8) * 255
+                return Image.fromarray(binary, mode='L'), {"umbral": threshold}
+            
+            # (etapa, archivo, etapa de entrada, parámetros, función)
+            stages = [
+                ("original", "00_original.png", None, {}, lambda get: (self.current_image, {})),
+                ("rotada", "01_rotada.png", "original", {"angulo": angle}, rotate),
+                ("resized", "02_resized.png", "rotada", {"escala": 0.5}, resize),
+                ("contraste", "03_contraste.png", "resized", {"alpha": alpha, "beta": beta}, contrast),
+                ("grises", "04_grises.png", "contraste", {}, grayscale),
+                ("binaria_otsu", "05_binaria_otsu.png", "grises", {}, binarize_otsu),
+                ("binaria_umbral", "06_binaria_umbral.png", "grises", {"umbral": threshold}, binarize_fixed),
+            ]
+            
+            with ExportStore(raw_cache=self.raw_intermediates.get()) as store:
+                source_hash = store.source_hash(self.current_image)
+                output_dir = store.claim_directory(base_name, source_hash)
+                
+                keys = {}
+                blobs = {}
+                
+                images = {}
+                
+                def get(name):
+                    # Carga desde el almacén solo las entradas que realmente se necesitan
+                    if name not in images:
+                        images[name] = store.load(blobs[name])
+                    return images[name]
+                
+                files = []
+                reused = 0
+                
+                for name, filename, parent, params, compute in stages:
+                    parent_key = keys[parent] if parent else source_hash
+                    keys[name] = store.stage_key(parent_key, name, params)
+                    
+                    cached = store.lookup(keys[name])
+                    if cached is not None:
+                        blobs[name], info = cached
+                        reused += 1
+                        if store.raw_cache:
+                            store.ensure_raw(blobs[name])
+                    else:
+                        images[name], info = compute(get)
+                        blobs[name] = store.save(keys[name], images[name], info)
+                    
+                    store.link(blobs[name], os.path.join(output_dir, filename))
+                    entry = {
+                        "archivo": filename,
+                        "etapa": name,
+                        "parametros": params,
+                        "sha256": blobs[name],
+                        "reutilizado": cached is not None,
+                        **info,
+                    }
+                    if store.raw_cache and os.path.exists(store.raw_path(blobs[name])):
+                        # Ruta del intermedio mapeable para otros procesos
+                        entry["npy"] = os.path.abspath(store.raw_path(blobs[name]))
+                    files.append(entry)
+            
+            # Guardar metadata en formato JSON
+            metadata = {
+                "imagen": base_name,
+                "fuente": os.path.abspath(self.image_path) if self.image_path else None,
+                "sha256_fuente": source_hash,
+                "fecha": datetime.now().astimezone().isoformat(timespec="seconds"),
+                "parametros": {
+                    "angulo_rotacion": angle,
+                    "contraste_alpha": alpha,
+                    "brillo_beta": beta,
+                    "metodo_binarizacion": bin_method,
+                    "umbral_fijo": threshold,
+                },
+                "archivos": files,
+            }
+            metadata_path = os.path.join(output_dir, "metadata.json")
             with open(metadata_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(metadata))
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
             
             messagebox.showinfo(
                 "Pipeline Exportado",
                 f"Pipeline exportado exitosamente en:\n{os.path.abspath(output_dir)}\n\n"
-                f"Se generaron 7 archivos de imagen y metadata.txt"
+                f"Se generaron {len(stages)} archivos de imagen y metadata.json\n"
+                f"({reused} etapas reutilizadas sin recalcular)"
             )
             
         except Exception as e:
             messagebox.showerror("Error", f"Error al exportar pipeline:\n{str(e)}")
 
+    
+    def process_sequence(self):
+        """
+        Procesa todos los cuadros de un GIF animado o TIFF multipágina.
+        Aplica las transformaciones elegidas y calcula el área (Otsu) de cada cuadro,
+        leyendo y escribiendo un cuadro a la vez. Genera un archivo multi-cuadro
+        y una serie temporal de área en CSV.
+        El procesamiento corre en un hilo aparte para que la ventana siga
+        respondiendo; el progreso se consulta con root.after y puede cancelarse.
+        """
+        try:
+            input_path = askopenfilename(
+                title="Seleccionar Secuencia (GIF o TIFF multipágina)",
+                filetypes=[
+                    ("Secuencias", "*.gif *.tif *.tiff"),
+                    ("Todos", "*.*")
+                ],
+                initialdir=os.path.dirname(self.image_path) if self.image_path else os.path.expanduser("~")
+            )
+            
+            if not input_path:
+                return
+            
+            ops_input = simpledialog.askstring(
+                "Transformaciones por cuadro",
+                "Transformaciones en orden, separadas por comas:\n"
+                "grayscale, contrast, invert, rotate, resize, binarize\n\n"
+                "Se usan los parámetros de la ventana principal.",
+                initialvalue="grayscale",
+                parent=self.root
+            )
+            if ops_input is None:
+                return
+            ops = parse_transforms(ops_input)
+            
+            base_name = os.path.splitext(os.path.basename(input_path))[0]
+            output_path = asksaveasfilename(
+                title="Guardar Secuencia Procesada",
+                defaultextension=".tif",
+                initialfile=f"{base_name}_procesada.tif",
+                filetypes=[
+                    ("TIFF multipágina", "*.tif *.tiff"),
+                    ("GIF animado", "*.gif")
+                ],
+                initialdir=os.path.dirname(input_path)
+            )
+            if not output_path:
+                return
+            try:
+                check_output_format(output_path)
+            except ValueError as e:
+                messagebox.showwarning("Formato no admitido", str(e))
+                return
+            csv_path = f"{os.path.splitext(output_path)[0]}_area.csv"
+            
+            response = messagebox.askyesnocancel(
+                "Selección de objeto",
+                "¿El objeto a medir es BLANCO?\n\n"
+                "Sí = objeto blanco\n"
+                "No = objeto negro\n"
+                "Cancelar = cancelar operación"
+            )
+            if response is None:  # Cancelar
+                return
+            
+            ppu = 0.0
+            ppu_input = simpledialog.askstring(
+                "Conversión a cm²",
+                "Si desea el área en cm², ingrese PPU (píxeles por cm).\n"
+                "Deje vacío para omitir:",
+                parent=self.root
+            )
+            if ppu_input and ppu_input.strip():
+                try:
+                    ppu = max(float(ppu_input.strip()), 0.0)
+                except ValueError:
+                    pass
+            
+            workers = simpledialog.askinteger(
+                "Procesamiento en paralelo",
+                "Número de procesos (1 = secuencial):",
+                initialvalue=1,
+                minvalue=1,
+                maxvalue=os.cpu_count() or 1,
+                parent=self.root
+            ) or 1
+            
+            params = {
+                "angle": self.rotation_angle.get(),
+                "alpha": self.contrast_alpha.get(),
+                "beta": self.brightness_beta.get(),
+                "method": self.binarization_method.get(),
+                "threshold": self.threshold_value.get(),
+                "object_is_white": response,
+                "ppu": ppu,
+            }
+            
+            self.run_sequence_job(input_path, output_path, csv_path, ops, params, workers)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al procesar secuencia:\n{str(e)}")
+    
+    def run_sequence_job(self, input_path, output_path, csv_path, ops, params, workers):
+        """
+        Ejecuta process_stack en un hilo de trabajo y muestra una ventana de
+        progreso con botón de cancelar. Tk solo se toca desde el hilo principal.
+        """
+        state = {"count": 0, "result": None, "error": None}
+        cancel = threading.Event()
+        
+        def progress(count):
+            state["count"] = count
+        
+        def work():
+            try:
+                state["result"] = process_stack(input_path, output_path, csv_path, ops, params,
+                                                workers, progress, cancel)
+            except Exception as e:
+                state["error"] = e
+        
+        win = tk.Toplevel(self.root)
+        win.title("Procesando Secuencia")
+        win.configure(bg="#34495e")
+        win.transient(self.root)
+        status = tk.Label(win, text="Iniciando...", bg="#34495e", fg="#ecf0f1",
+                          font=("Arial", 11), width=40)
+        status.pack(padx=20, pady=(15, 10))
+        cancel_button = tk.Button(win, text="Cancelar", command=cancel.set, bg="#e74c3c",
+                                  fg="white", font=("Arial", 10, "bold"), width=12)
+        cancel_button.pack(pady=(0, 15))
+        win.protocol("WM_DELETE_WINDOW", cancel.set)
+        
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                if cancel.is_set():
+                    status.config(text=f"Cancelando... ({state['count']} cuadros procesados)")
+                    cancel_button.config(state=tk.DISABLED)
+                else:
+                    status.config(text=f"Procesando cuadro {state['count'] + 1}...")
+                self.root.after(100, poll)
+                return
+            
+            win.destroy()
+            if state["error"] is not None:
+                messagebox.showerror("Error", f"Error al procesar secuencia:\n{str(state['error'])}")
+                return
+            
+            heading = "Secuencia Cancelada" if cancel.is_set() else "Secuencia Procesada"
+            messagebox.showinfo(
+                heading,
+                f"Se procesaron {state['result']} cuadros.\n\n"
+                f"Secuencia: {output_path}\n"
+                f"Área por cuadro: {csv_path}"
+            )
+        
+        poll()
+
 
 def main():
     """Función principal."""
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Servicio Local de Procesamiento de Imágenes
+Servidor asyncio (HTTP sobre localhost o socket Unix) que expone las
+transformaciones y el cálculo de área de image_processor.py sin interfaz gráfica.
+
+Las peticiones concurrentes con la misma operación, parámetros y tamaño se
+agrupan en micro-lotes y se procesan como una sola matriz apilada (N×H×W)
+dentro de un pool de procesos que mantiene NumPy y Pillow cargados.
+
+Endpoints:
+    POST /transform?op=<operación>&...   cuerpo: bytes de la imagen -> PNG
+    POST /area?objeto=blanco&ppu=10      cuerpo: bytes de la imagen -> JSON
+    GET  /stats                          profundidad de cola y latencias
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+import numpy as np
+
+from image_ops import area_stack, binarize_stack, contrast_stack, grayscale_stack, otsu_thresholds
+
+
+# Solo se escucha en la interfaz de loopback
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Ventana de agrupamiento y tamaño máximo de cada micro-lote
+BATCH_WINDOW = 0.005
+MAX_BATCH = 16
+
+# Límite del cuerpo de una petición (bytes) y tamaño de cada trozo enviado
+MAX_BODY = 64 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Número máximo de líneas de cabecera por petición
+MAX_HEADERS = 100
+
+# Número de latencias recientes usadas para los percentiles
+LATENCY_WINDOW = 1024
+
+OPERATIONS = ("grayscale", "binarize", "rotate", "invert", "resize", "contrast", "area")
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+# Funciones ejecutadas en los procesos del pool
+
+def _warm_worker():
+    """Inicializa un proceso del pool cargando NumPy y los códecs de Pillow."""
+    Image.init()
+    buffer = io.BytesIO()
+    Image.fromarray(np.zeros((2, 2), dtype=np.uint8), mode='L').save(buffer, format='PNG')
+    otsu_thresholds(np.zeros((1, 2, 2), dtype=np.uint8))
+
+
+def _ping():
+    """Tarea vacía usada para forzar el arranque de los procesos."""
+    return os.getpid()
+
+
+def _decode(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def _encode_png(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def run_batch(op, params, payloads):
+    """
+    Procesa un micro-lote de imágenes del mismo tamaño y modo.
+    Cada imagen se decodifica por separado; si una falla, solo esa petición
+    recibe el error. Si el lote apilado falla, se procesa imagen por imagen.
+
+    Args:
+        op: Nombre de la operación
+        params: Diccionario de parámetros (iguales para todo el lote)
+        payloads: Lista de bytes de imágenes codificadas
+
+    Returns:
+        list: Tupla (resultado, error) por imagen; el resultado es PNG codificado
+        (bytes) o diccionario de área, y error es None o el mensaje del fallo
+    """
+    outcomes = [None] * len(payloads)
+    images = []
+    indices = []
+    for i, data in enumerate(payloads):
+        try:
+            images.append(_decode(data))
+            indices.append(i)
+        except Exception as e:
+            outcomes[i] = (None, f"No se pudo decodificar la imagen: {e}")
+
+    if images:
+        try:
+            results = _process_images(op, params, images)
+        except Exception:
+            results = None
+        if results is not None:
+            for i, result in zip(indices, results):
+                outcomes[i] = (result, None)
+        else:
+            for i, img in zip(indices, images):
+                try:
+                    outcomes[i] = (_process_images(op, params, [img])[0], None)
+                except Exception as e:
+                    outcomes[i] = (None, f"Error al procesar: {e}")
+    return outcomes
+
+
+def _process_images(op, params, images):
+    """Aplica la operación a una lista de imágenes ya decodificadas."""
+    # Rotación y escalamiento usan el remuestreo de Pillow imagen por imagen
+    if op == "rotate":
+        return [_encode_png(img.rotate(params["angle"], expand=True,
+                                       resample=Image.Resampling.BICUBIC))
+                for img in images]
+    if op == "resize":
+        return [_encode_png(img.resize((img.width // 2, img.height // 2),
+                                       Image.Resampling.LANCZOS))
+                for img in images]
+
+    if op == "grayscale":
+        stack = np.stack([np.asarray(img.convert('RGB')) for img in images])
+        return [_encode_png(Image.fromarray(gray, mode='L')) for gray in grayscale_stack(stack)]
+
+    if op == "invert":
+        if images[0].mode not in ('RGB', 'L'):
+            images = [img.convert('RGB') for img in images]
+        stack = np.stack([np.asarray(img) for img in images])
+        return [_encode_png(Image.fromarray(inverted)) for inverted in 255 - stack]
+
+    stack = np.stack([np.asarray(img.convert('L')) for img in images])
+
+    if op == "contrast":
+        adjusted = contrast_stack(stack, params["alpha"], params["beta"])
+        return [_encode_png(Image.fromarray(arr, mode='L')) for arr in adjusted]
+
+    if op == "binarize":
+        if params["method"] == "otsu":
+            thresholds = otsu_thresholds(stack)
+        else:
+            thresholds = np.full(len(images), params["threshold"])
+        binary = binarize_stack(stack, thresholds)
+        return [_encode_png(Image.fromarray(arr, mode='L')) for arr in binary]
+
+    if op == "area":
+        pixel_areas, binarized = area_stack(stack, params["object_is_white"], params["threshold"])
+        results = []
+        for pixel_area, was_binarized in zip(pixel_areas, binarized):
+            result = {"pixels": int(pixel_area), "binarizada": bool(was_binarized)}
+            if params["ppu"] > 0:
+                result["cm2"] = int(pixel_area) / (params["ppu"] * params["ppu"])
+            results.append(result)
+        return results
+
+    raise ValueError(f"Operación desconocida: {op}")
+
+
+# Planificador de micro-lotes
+
+def parse_params(op, query):
+    """
+    Valida la operación y normaliza sus parámetros desde la query string.
+
+    Raises:
+        ValueError: Si la operación o algún parámetro no es válido
+    """
+    if op not in OPERATIONS:
+        raise ValueError(f"Operación desconocida: {op}. Disponibles: {', '.join(OPERATIONS)}")
+
+    def get(name, default):
+        return query.get(name, [default])[0]
+
+    if op == "rotate":
+        return {"angle": float(get("angle", 25.0))}
+    if op == "contrast":
+        return {"alpha": float(get("alpha", 1.2)), "beta": float(get("beta", 10.0))}
+    if op == "binarize":
+        method = get("method", "otsu")
+        if method not in ("otsu", "fixed"):
+            raise ValueError("El método de binarización debe ser 'otsu' o 'fixed'")
+        return {"method": method, "threshold": int(get("threshold", 128))}
+    if op == "area":
+        obj = get("objeto", "blanco")
+        if obj not in ("blanco", "negro"):
+            raise ValueError("El objeto debe ser 'blanco' o 'negro'")
+        return {
+            "object_is_white": obj == "blanco",
+            "threshold": int(get("threshold", 128)),
+            "ppu": float(get("ppu", 0)),
+        }
+    return {}
+
+
+class BatchScheduler:
+    """
+    Agrupa peticiones compatibles y las envía al pool como un solo lote.
+
+    Dos peticiones son compatibles si comparten operación, parámetros,
+    tamaño y modo de imagen; así pueden apilarse en una sola matriz.
+
+    Se envían al pool como máximo tantos lotes como procesos tiene; los demás
+    esperan aquí, de modo que queue_depth cuenta todas las peticiones que
+    ningún proceso ha empezado a atender.
+    """
+
+    def __init__(self, executor, workers, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.executor = executor
+        self.slots = asyncio.Semaphore(workers)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.pending = {}
+        self.queue_depth = 0
+        self.waiting_batches = 0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def submit(self, op, params, data):
+        """Encola una imagen y espera el resultado de su lote."""
+        start = time.perf_counter()
+        with Image.open(io.BytesIO(data)) as header:
+            # Solo se lee la cabecera; los píxeles se decodifican en el pool
+            key = (op, tuple(sorted(params.items())), header.size, header.mode)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if key not in self.pending:
+            timer = loop.call_later(self.batch_window, self._flush, key)
+            self.pending[key] = ([], timer)
+        batch = self.pending[key][0]
+        batch.append((data, future))
+        self.queue_depth += 1
+        self.total_requests += 1
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+
+        try:
+            return await future
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def _flush(self, key):
+        entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        batch, timer = entry
+        # Si el lote se llenó antes de tiempo, su temporizador no debe vaciar el siguiente
+        timer.cancel()
+        self.waiting_batches += 1
+        self.total_batches += 1
+        asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key, batch):
+        op = key[0]
+        params = dict(key[1])
+        loop = asyncio.get_running_loop()
+        await self.slots.acquire()
+        self.waiting_batches -= 1
+        self.queue_depth -= len(batch)
+        self.in_flight += 1
+        try:
+            results = await loop.run_in_executor(
+                self.executor, run_batch, op, params, [data for data, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), (result, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(ValueError(error))
+                else:
+                    future.set_result(result)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    def stats(self):
+        """Devuelve profundidad de cola, lotes y percentiles de latencia (ms)."""
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            rank = max(1, math.ceil(p / 100 * len(latencies)))
+            return round(latencies[rank - 1] * 1000, 3)
+
+        return {
+            "queue_depth": self.queue_depth,
+            "waiting_batches": self.waiting_batches,
+            "in_flight_batches": self.in_flight,
+            "requests": self.total_requests,
+            "batches": self.total_batches,
+            "mean_batch_size": (round(self.total_requests / self.total_batches, 3)
+                                if self.total_batches else None),
+            "latency_ms": {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99)},
+        }
+
+
+# Servidor HTTP mínimo
+
+class ImageService:
+    """Servidor HTTP/1.1 con keep-alive que atiende las peticiones del servicio."""
+
+    def __init__(self, workers=None, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        self.scheduler = BatchScheduler(self.executor, self.workers, batch_window, max_batch)
+
+    async def warm_up(self):
+        """Arranca todos los procesos del pool antes de aceptar conexiones."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _ping)
+                               for _ in range(self.workers)))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._dispatch(writer, method, target, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except (ValueError, asyncio.LimitOverrunError):
+            # Línea de cabecera demasiado larga u otra petición malformada
+            try:
+                await self._send_json(writer, 400, {"error": "Petición malformada"}, False)
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "Línea de petición inválida"}, False)
+            return None
+
+        headers = {}
+        count = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            count += 1
+            if count > MAX_HEADERS:
+                await self._send_json(writer, 400, {"error": "Demasiadas cabeceras"}, False)
+                return None
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "Content-Length inválido"}, False)
+            return None
+        if length > MAX_BODY:
+            await self._send_json(writer, 413, {"error": "Imagen demasiado grande"}, False)
+            return None
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, writer, method, target, body, keep_alive):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        if url.path == "/stats":
+            stats = self.scheduler.stats()
+            stats["workers"] = self.workers
+            await self._send_json(writer, 200, stats, keep_alive)
+            return
+
+        if url.path not in ("/transform", "/area"):
+            await self._send_json(writer, 404, {"error": f"Ruta desconocida: {url.path}"}, keep_alive)
+            return
+        if method != "POST":
+            await self._send_json(writer, 405, {"error": "Use POST con la imagen en el cuerpo"}, keep_alive)
+            return
+
+        op = "area" if url.path == "/area" else query.get("op", [""])[0]
+        try:
+            if url.path == "/transform" and op == "area":
+                raise ValueError("Use la ruta /area para calcular el área")
+            params = parse_params(op, query)
+            if not body:
+                raise ValueError("La petición no contiene una imagen")
+            result = await self.scheduler.submit(op, params, body)
+        except (ValueError, OSError) as e:
+            await self._send_json(writer, 400, {"error": str(e)}, keep_alive)
+            return
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": f"Error al procesar: {e}"}, keep_alive)
+            return
+
+        if op == "area":
+            await self._send_json(writer, 200, result, keep_alive)
+        else:
+            await self._send_stream(writer, result, "image/png", keep_alive)
+
+    async def _send_json(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(self._head(status, "application/json; charset=utf-8", keep_alive,
+                                f"Content-Length: {len(body)}"))
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_stream(self, writer, data, content_type, keep_alive):
+        """Envía el resultado por trozos (Transfer-Encoding: chunked)."""
+        writer.write(self._head(200, content_type, keep_alive, "Transfer-Encoding: chunked"))
+        view = memoryview(data)
+        for start in range(0, len(view), CHUNK_SIZE):
+            chunk = view[start:start + CHUNK_SIZE]
+            writer.write(f"{len(chunk):X}\r\n".encode("ascii"))
+            writer.write(chunk)
+            writer.write(b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _head(status, content_type, keep_alive, length_header):
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+            f"Content-Type: {content_type}",
+            length_header,
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def serve(port=DEFAULT_PORT, unix_path=None, workers=None,
+                batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+    """Arranca el pool, abre el socket local y atiende peticiones indefinidamente."""
+    service = ImageService(workers, batch_window, max_batch)
+    try:
+        await service.warm_up()
+        if unix_path:
+            server = await asyncio.start_unix_server(service.handle_connection, path=unix_path)
+            address = unix_path
+        else:
+            server = await asyncio.start_server(service.handle_connection, HOST, port)
+            address = f"http://{HOST}:{port}"
+        print(f"Servicio escuchando en {address} ({service.workers} procesos)")
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Servicio local de procesamiento de imágenes")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Puerto TCP en {HOST} (por defecto: {DEFAULT_PORT})")
+    parser.add_argument("--unix", metavar="RUTA",
+                        help="Escuchar en un socket Unix en lugar de TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos del pool (por defecto: número de CPUs)")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW * 1000,
+                        help="Ventana de agrupamiento en ms (por defecto: 5)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                        help=f"Tamaño máximo de lote (por defecto: {MAX_BATCH})")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.port, args.unix, args.workers,
+                          args.batch_window / 1000, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()